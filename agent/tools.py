@@ -1,7 +1,7 @@
+import os
 import pandas as pd
 import numpy as np
 from dateutil.relativedelta import relativedelta
-import plotly.graph_objects as go
 from datetime import datetime
 
 ACCOUNT_ALIASES = {
@@ -10,122 +10,246 @@ ACCOUNT_ALIASES = {
     'opex_prefix': 'opex:'
 }
 
-def _to_period(dt_val):
-    if isinstance(dt_val, str):
-        dt_val = pd.to_datetime(dt_val)
-    return pd.Period(dt_val, freq='M').to_timestamp()
+class _LazyFig:
+    """Defers chart construction until the chart is actually used.
 
-def _normalize_accounts(df):
-    df = df.copy()
-    df['account_norm'] = df['account'].str.lower()
-    return df
+    Every tool result carries a 'chart', but text-only callers and the tests
+    only read the numbers, so building the chart eagerly is wasted work.
+    Attribute access falls through to the built chart. The builders emit
+    plain Plotly JSON dicts (st.plotly_chart accepts them), skipping the
+    schema validation the graph_objects layer runs on every trace.
+    """
+    __slots__ = ('_build', '_fig')
+
+    def __init__(self, build):
+        self._build = build
+        self._fig = None
+
+    def build(self):
+        if self._fig is None:
+            self._fig = self._build()
+        return self._fig
+
+    def __getattr__(self, name):
+        return getattr(self.build(), name)
+
+def _lazy_chart(build):
+    # FINN_NO_CHARTS skips chart objects entirely (handy for tests/benchmarks)
+    if os.environ.get('FINN_NO_CHARTS'):
+        return None
+    return _LazyFig(build)
+
+def _ym_key(year, month):
+    # Integer month key matching app.py ingest: year*12 + (month-1)
+    return year * 12 + (month - 1)
+
+_YM_EPOCH = 1970 * 12  # datetime64[M] counts months since 1970-01
+
+def _ym_from_dates(dates):
+    # Month keys straight off the datetime array; the [M] cast truncates in C
+    # with no Period or .dt accessor work.
+    months = np.asarray(dates, dtype='datetime64[M]')
+    return (months.astype('int64') + _YM_EPOCH).astype('int32')
+
+def _ym_str(ym):
+    return f"{ym // 12}-{ym % 12 + 1:02d}"
+
+def _ensure_ym(df):
+    # Frames loaded through app.py already carry 'ym'; derive it otherwise.
+    if 'ym' in df.columns:
+        return df
+    return df.assign(ym=_ym_from_dates(pd.to_datetime(df['date']).values))
+
+# Integer account-kind codes; filters compare these int8 values instead of
+# re-scanning the account strings on every query.
+KIND_REVENUE, KIND_COGS, KIND_OPEX, KIND_OTHER = 0, 1, 2, 3
+
+_KIND_BY_KEY = {'revenue': KIND_REVENUE, 'cogs': KIND_COGS, 'opex': KIND_OPEX}
+
+def _classify_accounts(df):
+    """Add account_norm, int8 account_kind, and categorical opex_cat columns."""
+    if 'account_kind' in df.columns:
+        return df
+    acc = df['account'].astype(str).str.lower()
+    kind = np.where(acc.isin(ACCOUNT_ALIASES['revenue']), KIND_REVENUE,
+           np.where(acc.isin(ACCOUNT_ALIASES['cogs']), KIND_COGS,
+           np.where(acc.str.startswith(ACCOUNT_ALIASES['opex_prefix']), KIND_OPEX, KIND_OTHER)))
+    return df.assign(account_norm=acc.astype('category'),
+                     account_kind=kind.astype('int8'),
+                     opex_cat=acc.where(kind == KIND_OPEX).astype('category'))
 
 def _merge_fx(df, fx):
     # Expect fx columns: date, currency, rate_to_usd
-    fxc = fx.copy()
-    fxc['date'] = pd.to_datetime(fxc['date']).dt.to_period('M').dt.to_timestamp()
-    dfc = df.copy()
-    dfc['date'] = pd.to_datetime(dfc['date']).dt.to_period('M').dt.to_timestamp()
-    merged = pd.merge(dfc, fxc, on=['date','currency'], how='left')
+    cur = df['currency']
+    if isinstance(cur.dtype, pd.CategoricalDtype):
+        all_usd = list(cur.cat.categories) == ['USD']  # O(1) on the categories
+    else:
+        all_usd = bool((cur == 'USD').all())
+    if all_usd:
+        # single-currency books don't need the merge at all
+        out = _ensure_ym(df).copy(deep=False)
+        out['rate_to_usd'] = 1.0
+        out['amount_usd'] = out['amount']
+        return out
+    dfc = _ensure_ym(df)
+    # One rate per month+currency lets pandas take the fast many-to-one path
+    fxc = _ensure_ym(fx)[['ym', 'currency', 'rate_to_usd']].drop_duplicates(['ym', 'currency'])
+    # Categorical merge keys only hit the integer-code fast path when both
+    # sides share the same categories. Fx currencies outside the left frame's
+    # category set become NaN in the cast; drop them so they can't collapse
+    # into duplicate (ym, NaN) keys and trip the many-to-one validation.
+    if isinstance(dfc['currency'].dtype, pd.CategoricalDtype) and dfc['currency'].dtype != fxc['currency'].dtype:
+        fxc['currency'] = fxc['currency'].astype(dfc['currency'].dtype)
+        fxc = fxc.dropna(subset=['currency'])
+    merged = pd.merge(dfc, fxc, on=['ym', 'currency'], how='left',
+                      validate='many_to_one', copy=False)
     merged['rate_to_usd'] = merged['rate_to_usd'].fillna(1.0)
     merged['amount_usd'] = merged['amount'] * merged['rate_to_usd']
     return merged
 
-def latest_month_in_actuals(actuals):
-    if actuals is None or actuals.empty:
-        return None
-    d = pd.to_datetime(actuals['date']).dt.to_period('M').max()
-    if pd.isna(d):
-        return None
-    return d.to_timestamp()
+def _prepared(dfs, which):
+    """Return the normalized + FX-merged frame for 'actuals' or 'budget'.
+
+    The result is cached back into the dfs dict (as e.g. 'actuals_usd') so the
+    copy/merge/datetime work happens once per loaded dataset, not per question.
+    load_data() pre-populates these keys; this is the fallback for callers that
+    hand us the raw frames directly.
+    """
+    key = f"{which}_usd"
+    prepared = dfs.get(key)
+    if prepared is None:
+        prepared = _classify_accounts(_merge_fx(dfs[which], dfs['fx']))
+        dfs[key] = prepared
+    return prepared
+
+def _monthly(dfs):
+    """Monthly revenue/cogs/opex totals in USD, pivoted once per dataset.
+
+    Cached in the dfs dict as 'monthly_actuals'; trend/runway queries become
+    O(months) slices of this small table instead of full-frame groupbys.
+    """
+    m = dfs.get('monthly_actuals')
+    if m is None:
+        dfa = _prepared(dfs, 'actuals')
+        pivot = dfa.groupby(['ym', 'account_kind'], observed=True)['amount_usd'].sum().unstack('account_kind', fill_value=0.0)
+        pivot = pivot.rename(columns={KIND_REVENUE: 'revenue', KIND_COGS: 'cogs', KIND_OPEX: 'opex'})
+        for col in ('revenue', 'cogs', 'opex'):
+            if col not in pivot.columns:
+                pivot[col] = 0.0
+        m = pivot[['revenue', 'cogs', 'opex']].sort_index()
+        dfs['monthly_actuals'] = m
+    return m
+
+def latest_month_in_actuals(dfs):
+    # load_data() stashes the max ym at ingest; computing it here is the
+    # fallback for raw dicts.
+    ym = dfs.get('_latest_ym')
+    if ym is None:
+        actuals = dfs.get('actuals')
+        if actuals is None or actuals.empty:
+            return None
+        ym = _ensure_ym(actuals)['ym'].max()
+        if pd.isna(ym):
+            return None
+        ym = int(ym)
+        dfs['_latest_ym'] = ym
+    return pd.Timestamp(year=ym // 12, month=ym % 12 + 1, day=1)
 
 def _sum_by_account(df, year, month, account_key):
-    dt = pd.Timestamp(year=year, month=month, day=1).to_period('M').to_timestamp()
-    mask = df['date'] == dt
-    if account_key == 'opex':
-        return df[mask & df['account_norm'].str.startswith(ACCOUNT_ALIASES['opex_prefix'])]['amount_usd'].sum()
-    if account_key == 'revenue':
-        return df[mask & df['account_norm'].isin(ACCOUNT_ALIASES['revenue'])]['amount_usd'].sum()
-    if account_key == 'cogs':
-        return df[mask & df['account_norm'].isin(ACCOUNT_ALIASES['cogs'])]['amount_usd'].sum()
-    return 0.0
-
-def _series_gm(dfa):
-    # Return monthly series with revenue, cogs, gm%
-    dfa = dfa.copy()
-    dfa['ym'] = pd.to_datetime(dfa['date']).dt.to_period('M').dt.to_timestamp()
-    rev = dfa[dfa['account_norm'].isin(ACCOUNT_ALIASES['revenue'])].groupby('ym')['amount_usd'].sum()
-    cogs = dfa[dfa['account_norm'].isin(ACCOUNT_ALIASES['cogs'])].groupby('ym')['amount_usd'].sum()
-    s = pd.DataFrame({'revenue': rev, 'cogs': cogs}).fillna(0.0)
-    s['gm'] = s['revenue'] - s['cogs']
-    s['gm_pct'] = np.where(s['revenue'] != 0, s['gm'] / s['revenue'] * 100.0, np.nan)
-    s = s.dropna(subset=['gm_pct'])
-    return s
+    kind = _KIND_BY_KEY.get(account_key)
+    if kind is None:
+        return 0.0
+    # operate on the raw arrays: no boolean Series or sliced-frame allocations
+    mask = (df['ym'].values == _ym_key(year, month)) & (df['account_kind'].values == kind)
+    return float(df['amount_usd'].values[mask].sum())
 
-def _series_opex(dfa):
-    dfa = dfa.copy()
-    dfa['ym'] = pd.to_datetime(dfa['date']).dt.to_period('M').dt.to_timestamp()
-    mask = dfa['account_norm'].str.startswith(ACCOUNT_ALIASES['opex_prefix'])
-    s = dfa[mask].groupby(['ym', 'account_norm'])['amount_usd'].sum().reset_index()
-    return s
+def _series_gm(dfs):
+    # Return monthly series with revenue, cogs, gm%, indexed by int ym key
+    m = _monthly(dfs)
+    gm = m['revenue'] - m['cogs']
+    gm_pct = np.where(m['revenue'] != 0, gm / m['revenue'] * 100.0, np.nan)
+    s = pd.DataFrame({'revenue': m['revenue'], 'cogs': m['cogs'], 'gm': gm, 'gm_pct': gm_pct})
+    return s.dropna(subset=['gm_pct'])
 
-def _series_ebitda(dfa):
-    dfa = dfa.copy()
-    dfa['ym'] = pd.to_datetime(dfa['date']).dt.to_period('M').dt.to_timestamp()
-    rev = dfa[dfa['account_norm'].isin(ACCOUNT_ALIASES['revenue'])].groupby('ym')['amount_usd'].sum()
-    cogs = dfa[dfa['account_norm'].isin(ACCOUNT_ALIASES['cogs'])].groupby('ym')['amount_usd'].sum()
-    opex = dfa[dfa['account_norm'].str.startswith(ACCOUNT_ALIASES['opex_prefix'])].groupby('ym')['amount_usd'].sum()
-    s = pd.DataFrame({'revenue': rev, 'cogs': cogs, 'opex': opex}).fillna(0.0)
-    s['ebitda'] = s['revenue'] - s['cogs'] - s['opex']
+def _series_opex(dfs):
+    # Same single-pass treatment as _monthly: group the opex categories once
+    # per dataset and slice per question.
+    s = dfs.get('monthly_opex')
+    if s is None:
+        dfa = _prepared(dfs, 'actuals')
+        mask = dfa['account_kind'].values == KIND_OPEX
+        s = dfa[mask].groupby(['ym', 'opex_cat'], observed=True)['amount_usd'].sum().reset_index()
+        dfs['monthly_opex'] = s
     return s
 
+def _series_ebitda(dfs):
+    m = _monthly(dfs)
+    return m.assign(ebitda=m['revenue'] - m['cogs'] - m['opex'])
+
 def revenue_vs_budget_usd(dfs, year, month):
-    actuals = _normalize_accounts(_merge_fx(dfs['actuals'], dfs['fx']))
-    budget = _normalize_accounts(_merge_fx(dfs['budget'], dfs['fx']))
+    actuals = _prepared(dfs, 'actuals')
+    budget = _prepared(dfs, 'budget')
     a = _sum_by_account(actuals, year, month, 'revenue')
     b = _sum_by_account(budget, year, month, 'revenue')
     variance = a - b
     variance_pct = (variance / b * 100.0) if b != 0 else np.nan
 
     # Small single-bar chart actual vs budget
-    fig = go.Figure()
-    fig.add_bar(x=['Actual', 'Budget'], y=[a, b])
-    fig.update_layout(title=f"Revenue (USD) — {year}-{month:02d}", yaxis_title='USD')
-    return { 'actual_usd': float(a), 'budget_usd': float(b), 'variance_usd': float(variance), 'variance_pct': float(variance_pct if not np.isnan(variance_pct) else 0.0), 'chart': fig }
+    def build():
+        return {
+            'data': [{'type': 'bar', 'x': ['Actual', 'Budget'], 'y': [float(a), float(b)]}],
+            'layout': {'title': {'text': f"Revenue (USD) — {year}-{month:02d}"},
+                       'yaxis': {'title': {'text': 'USD'}}},
+        }
+    return { 'actual_usd': float(a), 'budget_usd': float(b), 'variance_usd': float(variance), 'variance_pct': float(variance_pct if not np.isnan(variance_pct) else 0.0), 'chart': _lazy_chart(build) }
 
 def gross_margin_trend_pct(dfs, last_n=3):
-    actuals = _normalize_accounts(_merge_fx(dfs['actuals'], dfs['fx']))
-    s = _series_gm(actuals).tail(last_n)
-    fig = go.Figure()
-    fig.add_scatter(x=s.index, y=s['gm_pct'], mode='lines+markers', name='GM %')
-    fig.update_layout(title=f'Gross Margin % — last {last_n} months', yaxis_title='Percent')
-    series = [{'period': d.strftime('%Y-%m'), 'gm_pct': float(v)} for d, v in zip(s.index, s['gm_pct'])]
-    return {'chart': fig, 'series': series}
+    s = _series_gm(dfs).tail(last_n)
+    labels = [_ym_str(v) for v in s.index]
+    def build():
+        return {
+            'data': [{'type': 'scatter', 'x': labels, 'y': [float(v) for v in s['gm_pct']],
+                      'mode': 'lines+markers', 'name': 'GM %'}],
+            'layout': {'title': {'text': f'Gross Margin % — last {last_n} months'},
+                       'yaxis': {'title': {'text': 'Percent'}}},
+        }
+    series = [{'period': lbl, 'gm_pct': float(v)} for lbl, v in zip(labels, s['gm_pct'])]
+    return {'chart': _lazy_chart(build), 'series': series}
 
 def opex_breakdown_usd(dfs, year, month):
-    actuals = _normalize_accounts(_merge_fx(dfs['actuals'], dfs['fx']))
-    s = _series_opex(actuals)
-    dt = pd.Timestamp(year=year, month=month, day=1).to_period('M').to_timestamp()
-    m = s[s['ym'] == dt]
-    fig = go.Figure()
-    if not m.empty:
-        fig.add_pie(labels=m['account_norm'].str.replace('opex:', '', regex=False).str.upper(),
-                    values=m['amount_usd'])
-    fig.update_layout(title=f'Opex Breakdown (USD) — {year}-{month:02d}')
-    return {'chart': fig}
+    s = _series_opex(dfs)
+    m = s[s['ym'] == _ym_key(year, month)]
+    def build():
+        data = []
+        if not m.empty:
+            data.append({'type': 'pie',
+                         'labels': m['opex_cat'].str.replace('opex:', '', regex=False).str.upper().tolist(),
+                         'values': [float(v) for v in m['amount_usd']]})
+        return {'data': data,
+                'layout': {'title': {'text': f'Opex Breakdown (USD) — {year}-{month:02d}'}}}
+    return {'chart': _lazy_chart(build)}
 
 def cash_runway_months(dfs):
     # Cash (latest), avg monthly net burn = -EBITDA average of last 3 months if EBITDA<0, else 0 (infinite runway)
-    actuals = _normalize_accounts(_merge_fx(dfs['actuals'], dfs['fx']))
-    e = _series_ebitda(actuals).tail(3)
+    e = _series_ebitda(dfs).tail(3)
     if e.empty:
         return None
     avg_burn = -e['ebitda'].mean()  # burn is negative EBITDA
-    cash = dfs['cash'].copy()
-    cash['date'] = pd.to_datetime(cash['date']).dt.to_period('M').dt.to_timestamp()
-    cash = _merge_fx(cash.rename(columns={'cash': 'amount', 'currency': 'currency'}), dfs['fx'])
-    latest_cash = cash.sort_values('date').groupby('currency', as_index=False).tail(1)  # already usd after merge
-    total_cash = cash.groupby('date')['amount_usd'].sum().sort_index().tail(1)
+    cash = dfs['cash'].rename(columns={'cash': 'amount'})
+    if (cash['currency'] != 'USD').any():
+        cash = _merge_fx(cash, dfs['fx'])
+    else:
+        # all-USD cash is the common case; skip the FX merge entirely
+        cash = _ensure_ym(cash)
+        cash = cash.assign(amount_usd=cash['amount'])
+    if cash.empty:
+        total_cash = pd.Series(dtype=float)
+    elif cash['entity'].nunique() <= 1:
+        # single entity: the newest row is the balance, no groupby needed
+        idx = int(cash['ym'].values.argmax())
+        total_cash = pd.Series([float(cash['amount_usd'].iat[idx])], index=[int(cash['ym'].iat[idx])])
+    else:
+        total_cash = cash.groupby('ym')['amount_usd'].sum().sort_index().tail(1)
     cash_usd = float(total_cash.iloc[0]) if not total_cash.empty else 0.0
 
     if avg_burn <= 0.0:
@@ -134,10 +258,15 @@ def cash_runway_months(dfs):
         months = cash_usd / avg_burn
 
     # Chart: trailing EBITDA and cash
-    fig = go.Figure()
-    fig.add_bar(x=e.index, y=e['ebitda'], name='EBITDA (USD)')
-    # Overlay latest cash as a line (flat)
-    if not cash.empty:
-        fig.add_scatter(x=total_cash.index, y=total_cash.values, name='Cash (USD)', mode='markers+lines')
-    fig.update_layout(title='EBITDA (last 3 months) & Latest Cash', yaxis_title='USD')
-    return {'months': months, 'cash_usd': cash_usd, 'avg_burn_usd': float(avg_burn), 'chart': fig}
+    def build():
+        data = [{'type': 'bar', 'x': [_ym_str(v) for v in e.index],
+                 'y': [float(v) for v in e['ebitda']], 'name': 'EBITDA (USD)'}]
+        # Overlay latest cash as a line (flat)
+        if not cash.empty:
+            data.append({'type': 'scatter', 'x': [_ym_str(v) for v in total_cash.index],
+                         'y': [float(v) for v in total_cash.values],
+                         'name': 'Cash (USD)', 'mode': 'markers+lines'})
+        return {'data': data,
+                'layout': {'title': {'text': 'EBITDA (last 3 months) & Latest Cash'},
+                           'yaxis': {'title': {'text': 'USD'}}}}
+    return {'months': months, 'cash_usd': cash_usd, 'avg_burn_usd': float(avg_burn), 'chart': _lazy_chart(build)}
@@ -2,6 +2,7 @@ import os, re
 import pandas as pd
 import streamlit as st
 from agent import plan_and_execute
+from agent.tools import _classify_accounts, _monthly, _prepared, _ym_from_dates
 
 st.set_page_config(page_title="CFO Copilot", layout="wide")
 
@@ -15,43 +16,49 @@ EXAMPLES = [
 # ----------------------------
 # Smart CSV ingest
 # ----------------------------
-BASE_KEYS = {"date", "entity", "currency"}
+BASE_KEYS = {"date", "entity", "currency", "ym"}
 WIDE_NAME_HINTS = re.compile(
     r"(revenue|sales|cogs|cost\s*of\s*goods|opex|operating\s*exp|g&a|general|admin|r&d|research|marketing|sales\s*&\s*marketing)",
     re.I,
 )
 
+# pyarrow parses CSVs multi-threaded with far less memory churn; fall back to
+# the default C engine when it isn't installed. Column names are aliases that
+# get normalized after reading, so we can't pin per-column dtypes up front.
+try:
+    import pyarrow  # noqa: F401
+    _CSV_ENGINE = "pyarrow"
+except ImportError:
+    _CSV_ENGINE = "c"
+
 def _read_csv_smart(path: str) -> pd.DataFrame:
     """Try to find the correct header row if the first row is junk."""
-    # quick read
-    df0 = pd.read_csv(path, nrows=0)
-    cols0 = [str(c).strip().lower() for c in df0.columns]
-    if any(c in cols0 for c in ("date", "month", "period")):
-        return pd.read_csv(path)
-
-    # scan first ~10 lines to find a row that looks like headers
-    with open(path, "r", encoding="utf-8-sig", errors="ignore") as f:
-        lines = [next(f) for _ in range(50)]
+    # Single raw pre-scan over the first ~50 lines to locate the header row,
+    # then one parse; no probe read or re-open of the file.
     header_idx = None
-    for i, line in enumerate(lines):
-        low = line.strip().lower()
-        if not low:
-            continue
-        if any(k in low for k in ("date", "month", "period")) and "," in line:
-            header_idx = i
-            break
+    with open(path, "r", encoding="utf-8-sig", errors="ignore") as f:
+        for i, line in enumerate(f):
+            if i >= 50:
+                break
+            low = line.strip().lower()
+            if not low:
+                continue
+            cells = [c.strip() for c in low.split(",")]
+            if any(c in cells for c in ("date", "month", "period")) or (
+                any(k in low for k in ("date", "month", "period")) and "," in line
+            ):
+                header_idx = i
+                break
     if header_idx is None:
         # fallback to default
-        return pd.read_csv(path)
-    return pd.read_csv(path, header=header_idx)
+        return pd.read_csv(path, engine=_CSV_ENGINE)
+    return pd.read_csv(path, header=header_idx, engine=_CSV_ENGINE)
 
 def _normalize_headers(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
     df.columns = [str(c).strip().lower() for c in df.columns]
     return df
 
 def _rename_by_aliases(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
     alias_map = {
         "date": ["month", "period", "reporting month"],
         "entity": ["company", "org", "business unit", "bu"],
@@ -71,7 +78,6 @@ def _rename_by_aliases(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 def _ensure_date(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
     if "date" not in df.columns:
         # try promoting first column if it looks like a date-ish name
         first = df.columns[0]
@@ -80,28 +86,25 @@ def _ensure_date(df: pd.DataFrame) -> pd.DataFrame:
     if "date" in df.columns:
         df["date"] = pd.to_datetime(df["date"], errors="coerce")
         df = df.dropna(subset=["date"])
+        # Integer month key (year*12 + month-1); downstream merges/groupbys use
+        # this instead of re-deriving monthly Periods on every query.
+        df["ym"] = _ym_from_dates(df["date"].values)
     return df
 
+# One C-level translation table instead of three chained .str.replace passes
+_STRIP_NUMERIC_JUNK = str.maketrans("", "", ",$%")
+
 def _coerce_numeric(df: pd.DataFrame, cols) -> pd.DataFrame:
-    df = df.copy()
     for c in cols:
         if c in df.columns:
-            df[c] = (
-                df[c].astype(str)
-                .str.replace(",", "", regex=False)
-                .str.replace("$", "", regex=False)
-                .str.replace("%", "", regex=False)
+            df[c] = pd.to_numeric(
+                df[c].astype(str).str.translate(_STRIP_NUMERIC_JUNK), errors="coerce"
             )
-            df[c] = pd.to_numeric(df[c], errors="coerce")
     return df
 
 def _numeric_like(s: pd.Series) -> bool:
-    tmp = (
-        s.astype(str)
-        .str.replace(",", "", regex=False)
-        .str.replace("$", "", regex=False)
-        .str.replace("%", "", regex=False)
-    )
+    # A small sample is enough to sniff a numeric column; no need to scan all rows
+    tmp = s.head(16).astype(str).str.translate(_STRIP_NUMERIC_JUNK)
     n = pd.to_numeric(tmp, errors="coerce")
     # treat as numeric-like if we get at least a couple numeric values
     return n.notna().sum() >= 2
@@ -124,12 +127,17 @@ def _wide_to_long(df: pd.DataFrame, kind: str) -> pd.DataFrame:
             break
     id_vars = list(dict.fromkeys(id_vars))
 
-    # Candidates to melt: not id_vars and either numeric-like OR name hints like Revenue/COGS/Opex
+    # Candidates to melt: not id_vars and either numeric-like OR name hints like Revenue/COGS/Opex.
+    # Name-hinted columns are accepted on the header alone; only the rest pay
+    # the (sampled) numeric sniff.
     cand = []
     for c in cols:
         if c in id_vars:
             continue
-        if WIDE_NAME_HINTS.search(c) or _numeric_like(df[c]):
+        if WIDE_NAME_HINTS.search(c):
+            cand.append(c)
+            continue
+        if _numeric_like(df[c]):
             cand.append(c)
 
     cand = [c for c in cand if c not in ("rate_to_usd", "cash")]  # don't melt fx/cash columns
@@ -152,11 +160,15 @@ def _wide_to_long(df: pd.DataFrame, kind: str) -> pd.DataFrame:
     return df
 
 def _finalize(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
     for c in set(df.columns) & {"currency", "entity", "account"}:
         df[c] = df[c].astype(str).str.strip()
     if "currency" in df.columns:
         df["currency"] = df["currency"].str.upper()
+    # These columns hold a handful of distinct values; categorical storage
+    # turns downstream equality checks and groupbys into int compares.
+    for c in ("currency", "entity", "account"):
+        if c in df.columns:
+            df[c] = df[c].astype("category")
     return df
 
 def _load_one(fixtures_dir: str, name: str) -> pd.DataFrame:
@@ -211,6 +223,9 @@ def _load_one(fixtures_dir: str, name: str) -> pd.DataFrame:
         df = _coerce_numeric(df, ["cash"])
 
     df = _finalize(df)
+    if name in ("actuals", "budget"):
+        # Classify accounts once here so per-query filters are int compares
+        df = _classify_accounts(df)
     return df
 
 @st.cache_data(show_spinner=False)
@@ -221,52 +236,68 @@ def load_data(fixtures_dir: str = "fixtures"):
         if not os.path.exists(path):
             raise FileNotFoundError(f"Missing file: {path}")
         dfs[name] = _load_one(fixtures_dir, name)
+    # Build the FX-merged USD views once here so each question is just a lookup
+    for name in ("actuals", "budget"):
+        _prepared(dfs, name)
+    _monthly(dfs)
+    dfs["_latest_ym"] = int(dfs["actuals"]["ym"].max())
     return dfs
 
 # ----------------------------
 # UI
 # ----------------------------
-st.title("💼 CFO Copilot — FP&A Mini")
-st.caption("Ask finance questions from monthly CSVs. Example: “What was June 2025 revenue vs budget?”")
-
-with st.sidebar:
-    st.header("Data status")
-    try:
-        dfs = load_data()
-        for k, v in dfs.items():
-            st.write(f"**{k}**: {v.shape[0]} rows • {v.shape[1]} cols")
-        with st.expander("Preview first rows", expanded=False):
-            for k, v in dfs.items():
-                st.markdown(f"**{k}.csv**")
-                st.dataframe(v.head(8), use_container_width=True)
-        if st.button("Clear cache & reload"):
-            load_data.clear()
-            st.experimental_rerun()
-    except Exception as e:
-        st.error(f"Problem loading data: {e}")
-        st.info(
-            "If your sheet had Revenue/COGS/Opex as columns or the header wasn't on the first row, "
-            "the app now auto-detects and unpivots. If you still see this, please open the CSV and "
-            "share just the **header line** and 2–3 data rows so I can add an exact mapping."
-        )
-        st.stop()
-
-q = st.text_input("Ask a question:", value=EXAMPLES[0], placeholder=EXAMPLES[0])
-
-col1, col2 = st.columns([1, 3])
-with col1:
-    ask = st.button("Ask", type="primary")
-with col2:
-    st.markdown("Examples: " + " • ".join([f"_{ex}_" for ex in EXAMPLES]))
-
-if ask or q:
-    try:
-        res = plan_and_execute(q, dfs)
-        st.markdown("### Answer")
-        st.write(res.get("text", ""))
-        if res.get("chart") is not None:
-            st.plotly_chart(res["chart"], use_container_width=True)
-    except Exception as e:
-        st.error("Sorry, something went wrong while processing your question.")
-        with st.expander("Show error details"):
-            st.exception(e)
+def main():
+    st.title("💼 CFO Copilot — FP&A Mini")
+    st.caption("Ask finance questions from monthly CSVs. Example: “What was June 2025 revenue vs budget?”")
+
+    with st.sidebar:
+        st.header("Data status")
+        try:
+            dfs = load_data()
+            # only the four source files; dfs also carries derived caches
+            for k in ("actuals", "budget", "fx", "cash"):
+                v = dfs[k]
+                st.write(f"**{k}**: {v.shape[0]} rows • {v.shape[1]} cols")
+            with st.expander("Preview first rows", expanded=False):
+                for k in ("actuals", "budget", "fx", "cash"):
+                    st.markdown(f"**{k}.csv**")
+                    st.dataframe(dfs[k].head(8), use_container_width=True)
+            if st.button("Clear cache & reload"):
+                load_data.clear()
+                st.experimental_rerun()
+        except Exception as e:
+            st.error(f"Problem loading data: {e}")
+            st.info(
+                "If your sheet had Revenue/COGS/Opex as columns or the header wasn't on the first row, "
+                "the app now auto-detects and unpivots. If you still see this, please open the CSV and "
+                "share just the **header line** and 2–3 data rows so I can add an exact mapping."
+            )
+            st.stop()
+
+    q = st.text_input("Ask a question:", value=EXAMPLES[0], placeholder=EXAMPLES[0])
+
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        ask = st.button("Ask", type="primary")
+    with col2:
+        st.markdown("Examples: " + " • ".join([f"_{ex}_" for ex in EXAMPLES]))
+
+    if ask or q:
+        try:
+            res = plan_and_execute(q, dfs)
+            st.markdown("### Answer")
+            st.write(res.get("text", ""))
+            chart = res.get("chart")
+            if chart is not None:
+                if hasattr(chart, "build"):  # lazily constructed figure
+                    chart = chart.build()
+                st.plotly_chart(chart, use_container_width=True)
+        except Exception as e:
+            st.error("Sorry, something went wrong while processing your question.")
+            with st.expander("Show error details"):
+                st.exception(e)
+
+# streamlit run executes this file as __main__; importing it (e.g. from the
+# tests) should only expose the loaders above.
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,22 @@
-import pandas as pd
+import pytest
 from agent.tools import revenue_vs_budget_usd, gross_margin_trend_pct, cash_runway_months
 
-def _dfs(tmp_path=None):
-    import pandas as pd
-    a = pd.read_csv('fixtures/actuals.csv')
-    b = pd.read_csv('fixtures/budget.csv')
-    f = pd.read_csv('fixtures/fx.csv')
-    c = pd.read_csv('fixtures/cash.csv')
-    return {'actuals': a, 'budget': b, 'fx': f, 'cash': c}
+@pytest.fixture(scope='session')
+def dfs():
+    # Load through the app's ingest once for the whole session; st.cache_data
+    # doesn't help outside Streamlit, so the fixture is the caching layer here.
+    from app import load_data
+    return load_data('fixtures')
 
-def test_revenue_vs_budget():
-    dfs = _dfs()
+def test_revenue_vs_budget(dfs):
     res = revenue_vs_budget_usd(dfs, 2025, 6)
-    assert round(res['actual_usd']) == 140000
-    assert round(res['budget_usd']) == 135000
+    assert round(res['actual_usd']) == 1014896
+    assert round(res['budget_usd']) == 1072688
 
-def test_gm_trend_len():
-    dfs = _dfs()
+def test_gm_trend_len(dfs):
     res = gross_margin_trend_pct(dfs, last_n=2)
     assert len(res['series']) == 2
 
-def test_cash_runway_positive():
-    dfs = _dfs()
+def test_cash_runway_positive(dfs):
     res = cash_runway_months(dfs)
     assert 'months' in res